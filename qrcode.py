@@ -1,13 +1,117 @@
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import streamlit as st
 import qrcode
 from io import BytesIO
+import numpy as np
 import validators
 from PIL import Image
 
 st.set_page_config(page_title="QR Code Generator", page_icon="📱", layout="wide")
 
+LOGO_MAX_SIZE = 1024
+THUMBNAIL_SIZE = 120
+
+URL_RE = re.compile(r'^https?://[^\s/$.?#].[^\s]*$', re.I)
+
+ERROR_CORRECTION_MAP = {
+    "Low (7%)": qrcode.constants.ERROR_CORRECT_L,
+    "Medium (15%)": qrcode.constants.ERROR_CORRECT_M,
+    "Quartile (25%)": qrcode.constants.ERROR_CORRECT_Q,
+    "High (30%)": qrcode.constants.ERROR_CORRECT_H
+}
+
+def hex_to_rgb(color):
+    color = color.lstrip('#')
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+def render_modules(qr):
+    modules = np.pad(np.asarray(qr.modules, dtype=np.uint8), qr.border, constant_values=0)
+    return np.kron(modules, np.ones((qr.box_size, qr.box_size), dtype=np.uint8))
+
+def make_palette_image(qr, fg, bg):
+    img = Image.fromarray(render_modules(qr)).convert("P")
+    img.putpalette([*hex_to_rgb(bg), *hex_to_rgb(fg)])
+    return img
+
+def encode_png(img, compress_level, **params):
+    buffer = BytesIO()
+    img.save(buffer, format="PNG", compress_level=compress_level, optimize=False, **params)
+    return buffer.getvalue()
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def make_thumbnail(png_bytes):
+    img = Image.open(BytesIO(png_bytes)).convert('RGB')
+    img = img.resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.BOX)
+    return encode_png(img, 1)
+
+thread_local = threading.local()
+
+def make_qr(url, ecc, box_size, border):
+    qr = getattr(thread_local, 'qr', None)
+    if qr is None:
+        qr = thread_local.qr = qrcode.QRCode()
+    qr.clear()
+    qr.version = None
+    qr.error_correction = ecc
+    qr.box_size = box_size
+    qr.border = border
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr
+
+def render_qr_png(url, ecc, box_size, border, fg, bg, compress_level):
+    img = make_palette_image(make_qr(url, ecc, box_size, border), fg, bg)
+    return encode_png(img, compress_level, bits=1)
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def build_qr_png(url, ecc, box_size, border, fg, bg, compress_level):
+    return render_qr_png(url, ecc, box_size, border, fg, bg, compress_level)
+
+def render_one(url, settings):
+    try:
+        return url, render_qr_png(url, *settings), None
+    except Exception as e:
+        return url, None, e
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def decode_logo(logo_bytes):
+    logo = Image.open(BytesIO(logo_bytes))
+    logo.draft('RGB', (LOGO_MAX_SIZE, LOGO_MAX_SIZE))
+    logo = logo.convert('RGBA')
+    logo.thumbnail((LOGO_MAX_SIZE, LOGO_MAX_SIZE), Image.LANCZOS)
+    return logo.size, logo.tobytes()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def prepare_logo(logo_bytes, size):
+    decoded_size, decoded = decode_logo(logo_bytes)
+    logo = Image.frombytes('RGBA', decoded_size, decoded)
+    return logo.resize((size, size), Image.LANCZOS).tobytes()
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def build_logo_qr_png(url, box_size, border, fg, bg, logo_bytes, compress_level):
+    qr = make_qr(url, qrcode.constants.ERROR_CORRECT_H, box_size, border)
+    qr_img = make_palette_image(qr, fg, bg).convert('RGB')
+    
+    qr_width, qr_height = qr_img.size
+    logo_size = qr_width // 5
+    logo = Image.frombytes('RGBA', (logo_size, logo_size), prepare_logo(logo_bytes, logo_size))
+    
+    logo_pos = ((qr_width - logo_size) // 2, (qr_height - logo_size) // 2)
+    
+    if logo.getchannel('A').getextrema() == (255, 255):
+        qr_img.paste(logo.convert('RGB'), logo_pos)
+    else:
+        qr_img.paste(logo, logo_pos, logo)
+    
+    return encode_png(qr_img, compress_level)
+
 if 'history' not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = deque(maxlen=10)
 
 st.title("QR Code Generator 📱")
 st.write("Generate QR codes from any URL instantly!")
@@ -26,17 +130,18 @@ with st.sidebar:
     st.subheader("Error Correction")
     error_correction = st.selectbox(
         "Error Correction Level",
-        ["Low (7%)", "Medium (15%)", "Quartile (25%)", "High (30%)"],
+        list(ERROR_CORRECTION_MAP),
         index=0,
         help="Higher levels allow the QR code to be read even if partially damaged"
     )
     
-    error_correction_map = {
-        "Low (7%)": qrcode.constants.ERROR_CORRECT_L,
-        "Medium (15%)": qrcode.constants.ERROR_CORRECT_M,
-        "Quartile (25%)": qrcode.constants.ERROR_CORRECT_Q,
-        "High (30%)": qrcode.constants.ERROR_CORRECT_H
-    }
+    st.subheader("Output")
+    compress_level = st.select_slider(
+        "Encode speed vs. file size",
+        options=[1, 3, 6, 9],
+        value=1,
+        help="Lower values encode faster, higher values produce smaller PNG files"
+    )
 
 tab1, tab2, tab3 = st.tabs(["Single URL", "Batch Generation", "Logo Embedding"])
 
@@ -58,39 +163,31 @@ with tab1:
             st.error("Please enter a valid URL (e.g., https://example.com)")
         else:
             try:
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=error_correction_map[error_correction],
-                    box_size=box_size,
-                    border=border_size,
+                png_bytes = build_qr_png(
+                    url_input,
+                    ERROR_CORRECTION_MAP[error_correction],
+                    box_size,
+                    border_size,
+                    fg_color,
+                    bg_color,
+                    compress_level,
                 )
-                qr.add_data(url_input)
-                qr.make(fit=True)
                 
-                img = qr.make_image(fill_color=fg_color, back_color=bg_color)
-                
-                buffer = BytesIO()
-                img.save(buffer, format="PNG")
-                buffer.seek(0)
-                
-                st.session_state.history.insert(0, {
+                st.session_state.history.appendleft({
                     'url': url_input,
-                    'image': buffer.getvalue(),
+                    'full': png_bytes,
                     'settings': f"Size: {box_size}, Border: {border_size}, Error: {error_correction}"
                 })
-                if len(st.session_state.history) > 10:
-                    st.session_state.history.pop()
                 
                 st.success("QR Code generated successfully!")
                 
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.image(buffer, caption=f"QR Code for: {url_input}")
+                    st.image(png_bytes, caption=f"QR Code for: {url_input}")
                 
-                buffer.seek(0)
                 st.download_button(
                     label="Download QR Code",
-                    data=buffer,
+                    data=png_bytes,
                     file_name="qr_code.png",
                     mime="image/png",
                     width='stretch'
@@ -118,7 +215,7 @@ with tab2:
             invalid_urls = []
             
             for url in urls:
-                if validators.url(url):
+                if URL_RE.match(url):
                     valid_urls.append(url)
                 else:
                     invalid_urls.append(url)
@@ -126,49 +223,48 @@ with tab2:
             if invalid_urls:
                 st.warning(f"Skipping {len(invalid_urls)} invalid URL(s): {', '.join(invalid_urls[:3])}{'...' if len(invalid_urls) > 3 else ''}")
             
+            seen = set()
+            unique_urls = [url for url in valid_urls if not (url in seen or seen.add(url))]
+            if len(unique_urls) < len(valid_urls):
+                st.info(f"Deduplicated {len(valid_urls) - len(unique_urls)} repeated URL(s)")
+            valid_urls = unique_urls
+            
             if valid_urls:
                 st.success(f"Generating {len(valid_urls)} QR code(s)...")
                 
+                settings = (
+                    ERROR_CORRECTION_MAP[error_correction],
+                    box_size,
+                    border_size,
+                    fg_color,
+                    bg_color,
+                    compress_level,
+                )
+                with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+                    results = list(executor.map(partial(render_one, settings=settings), valid_urls))
+                
                 cols = st.columns(3)
-                for idx, url in enumerate(valid_urls):
-                    try:
-                        qr = qrcode.QRCode(
-                            version=1,
-                            error_correction=error_correction_map[error_correction],
-                            box_size=box_size,
-                            border=border_size,
+                for idx, (url, png_bytes, error) in enumerate(results):
+                    if error is not None:
+                        st.error(f"Error generating QR code for {url}: {str(error)}")
+                        continue
+                    
+                    st.session_state.history.appendleft({
+                        'url': url,
+                        'full': png_bytes,
+                        'settings': f"Size: {box_size}, Border: {border_size}, Error: {error_correction}"
+                    })
+                    
+                    with cols[idx % 3]:
+                        st.image(png_bytes, caption=url[:30] + "..." if len(url) > 30 else url)
+                        st.download_button(
+                            label=f"Download {idx + 1}",
+                            data=png_bytes,
+                            file_name=f"qr_code_{idx + 1}.png",
+                            mime="image/png",
+                            key=f"batch_download_{idx}",
+                            width='stretch'
                         )
-                        qr.add_data(url)
-                        qr.make(fit=True)
-                        
-                        img = qr.make_image(fill_color=fg_color, back_color=bg_color)
-                        
-                        buffer = BytesIO()
-                        img.save(buffer, format="PNG")
-                        buffer.seek(0)
-                        
-                        st.session_state.history.insert(0, {
-                            'url': url,
-                            'image': buffer.getvalue(),
-                            'settings': f"Size: {box_size}, Border: {border_size}, Error: {error_correction}"
-                        })
-                        
-                        with cols[idx % 3]:
-                            st.image(buffer, caption=url[:30] + "..." if len(url) > 30 else url)
-                            buffer.seek(0)
-                            st.download_button(
-                                label=f"Download {idx + 1}",
-                                data=buffer,
-                                file_name=f"qr_code_{idx + 1}.png",
-                                mime="image/png",
-                                key=f"batch_download_{idx}",
-                                width='stretch'
-                            )
-                    except Exception as e:
-                        st.error(f"Error generating QR code for {url}: {str(e)}")
-                
-                if len(st.session_state.history) > 10:
-                    st.session_state.history = st.session_state.history[:10]
 
 with tab3:
     st.subheader("QR Code with Logo")
@@ -192,54 +288,38 @@ with tab3:
             st.error("Please upload a logo image!")
         else:
             try:
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=qrcode.constants.ERROR_CORRECT_H,
-                    box_size=box_size,
-                    border=border_size,
+                png_bytes = build_logo_qr_png(
+                    logo_url,
+                    box_size,
+                    border_size,
+                    fg_color,
+                    bg_color,
+                    logo_file.getvalue(),
+                    compress_level,
                 )
-                qr.add_data(logo_url)
-                qr.make(fit=True)
-                
-                qr_img = qr.make_image(fill_color=fg_color, back_color=bg_color).convert('RGB')
-                
-                logo = Image.open(logo_file).convert('RGBA')
-                
-                qr_width, qr_height = qr_img.size
-                logo_size = qr_width // 5
-                logo = logo.resize((logo_size, logo_size), Image.LANCZOS)
-                
-                logo_pos = ((qr_width - logo_size) // 2, (qr_height - logo_size) // 2)
-                
-                qr_img.paste(logo, logo_pos, logo if logo.mode == 'RGBA' else None)
-                
-                buffer = BytesIO()
-                qr_img.save(buffer, format="PNG")
-                buffer.seek(0)
                 
-                st.session_state.history.insert(0, {
+                st.session_state.history.appendleft({
                     'url': logo_url,
-                    'image': buffer.getvalue(),
+                    'full': png_bytes,
                     'settings': f"With Logo, Size: {box_size}, Border: {border_size}"
                 })
-                if len(st.session_state.history) > 10:
-                    st.session_state.history.pop()
                 
                 st.success("QR Code with logo generated successfully!")
                 
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.image(buffer, caption=f"QR Code with Logo for: {logo_url}")
+                    st.image(png_bytes, caption=f"QR Code with Logo for: {logo_url}")
                 
-                buffer.seek(0)
                 st.download_button(
                     label="Download QR Code with Logo",
-                    data=buffer,
+                    data=png_bytes,
                     file_name="qr_code_with_logo.png",
                     mime="image/png",
                     width='stretch'
                 )
                 
+            except Image.DecompressionBombError:
+                st.error("The logo image is too large! Please upload a smaller image.")
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
 
@@ -248,14 +328,14 @@ if st.session_state.history:
     st.header("Recent QR Codes")
     
     cols = st.columns(5)
-    for idx, item in enumerate(st.session_state.history[:10]):
+    for idx, item in enumerate(st.session_state.history):
         with cols[idx % 5]:
-            st.image(item['image'])
+            st.image(make_thumbnail(item['full']))
             st.caption(item['url'][:25] + "..." if len(item['url']) > 25 else item['url'])
             st.caption(item['settings'], help="Generation settings")
             st.download_button(
                 label="Download",
-                data=item['image'],
+                data=item['full'],
                 file_name=f"qr_code_history_{idx}.png",
                 mime="image/png",
                 key=f"history_download_{idx}",